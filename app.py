@@ -1,11 +1,31 @@
 # app.py - NutriGuard AI with Full Multi-Language Support
 import os
 import re
-import json
+import hashlib
+from collections import OrderedDict
 from typing import Dict, Any, List
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+import orjson
+import msgspec
+import pybreaker
 import requests
-import traceback
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import queue
+import logging
+import logging.handlers
+import atexit
+from contextlib import contextmanager
+import numpy as np
+from cachetools import TTLCache
+from diskcache import Cache
+try:
+    from gevent import monkey as gevent_monkey
+except ImportError:
+    gevent_monkey = None
 from datetime import datetime, timedelta
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
@@ -16,16 +36,46 @@ load_dotenv()
 
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson"""
+    
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if kwargs.get("sort_keys", self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get("indent"):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode("utf-8")
+    
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        return orjson.loads(s)
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 app.secret_key = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 
-app.config['DEBUG'] = True
+# Debug only for the local dev server; gunicorn deployments set FLASK_ENV=production
+app.config['DEBUG'] = os.getenv("FLASK_ENV", "development") != "production"
 app.config['PROPAGATE_EXCEPTIONS'] = True
 app.config['SESSION_COOKIE_SECURE'] = False
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=24)
 
+# ----------------- LOGGING -----------------
+# Request threads only enqueue records; a background listener does the stream I/O
+logger = logging.getLogger("nutri")
+logger.setLevel(os.getenv("LOG_LEVEL", "DEBUG" if app.config['DEBUG'] else "INFO").upper())
+logger.propagate = False
+
+_log_queue = queue.Queue(-1)
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
 # ----------------- COMPREHENSIVE TRANSLATIONS -----------------
 TRANSLATIONS = {
     'en': {
@@ -673,19 +723,95 @@ SCOPES = [
     'https://www.googleapis.com/auth/fitness.location.read'
 ]
 
-print("\n" + "="*60)
-print("🔑 API KEY STATUS:")
-print("="*60)
-print(f"USDA_API_KEY: {'✅ SET' if USDA_API_KEY and USDA_API_KEY != 'DEMO_KEY' else '⚠️ USING DEMO'}")
-print(f"WEATHER_API_KEY: {'✅ SET' if WEATHER_API_KEY else '❌ NOT SET'}")
-print(f"GROQ_API_KEY: {'✅ SET' if GROQ_API_KEY else '❌ NOT SET'}")
-print(f"GOOGLE_CLIENT_ID: {'✅ SET' if GOOGLE_CLIENT_ID else '❌ NOT SET'}")
-print(f"GOOGLE_CLIENT_SECRET: {'✅ SET' if GOOGLE_CLIENT_SECRET else '❌ NOT SET'}")
-print("="*60 + "\n")
+logger.info("🔑 API KEY STATUS:")
+logger.info("USDA_API_KEY: %s", '✅ SET' if USDA_API_KEY and USDA_API_KEY != 'DEMO_KEY' else '⚠️ USING DEMO')
+logger.info("WEATHER_API_KEY: %s", '✅ SET' if WEATHER_API_KEY else '❌ NOT SET')
+logger.info("GROQ_API_KEY: %s", '✅ SET' if GROQ_API_KEY else '❌ NOT SET')
+logger.info("GOOGLE_CLIENT_ID: %s", '✅ SET' if GOOGLE_CLIENT_ID else '❌ NOT SET')
+logger.info("GOOGLE_CLIENT_SECRET: %s", '✅ SET' if GOOGLE_CLIENT_SECRET else '❌ NOT SET')
 
 GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
+# Smaller model for short chat turns that don't need to reason over deficiencies
+GROQ_CHAT_FAST_MODEL = os.getenv("GROQ_CHAT_FAST_MODEL", "llama-3.1-8b-instant")
+CHAT_MAX_TOKENS = 150
 GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
 
+# gunicorn's gevent worker patches threading before it imports this module
+GEVENT_ACTIVE = bool(gevent_monkey and gevent_monkey.is_module_patched("threading"))
+
+# Fan-out width of one request's upstream lookups
+LOOKUP_POOL_SIZE = 8
+# Requests one gevent worker serves at once; matches gunicorn --worker-connections
+WORKER_CONNECTIONS = int(os.getenv("WORKER_CONNECTIONS", "1000"))
+# Under gevent every in-flight request may hold upstream connections at the same time
+HTTP_POOL_MAXSIZE = WORKER_CONNECTIONS if GEVENT_ACTIVE else 64
+
+# Shared HTTP session so every upstream call reuses pooled TCP/TLS connections
+HTTP_SESSION = requests.Session()
+HTTP_ADAPTER = HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=HTTP_POOL_MAXSIZE,
+    max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[429, 502, 503, 504]),
+)
+HTTP_SESSION.mount("https://", HTTP_ADAPTER)
+HTTP_SESSION.mount("http://", HTTP_ADAPTER)
+
+def is_client_error(exc: Exception) -> bool:
+    """4xx responses (other than rate limiting) mean a bad request, not an upstream outage"""
+    response = getattr(exc, "response", None)
+    return (isinstance(exc, requests.HTTPError) and response is not None
+            and 400 <= response.status_code < 500 and response.status_code != 429)
+
+# One breaker per upstream so an outage in one doesn't fail-fast the others
+GROQ_BREAKER = pybreaker.CircuitBreaker(fail_max=5, reset_timeout=30, exclude=[is_client_error], name="groq")
+USDA_BREAKER = pybreaker.CircuitBreaker(fail_max=5, reset_timeout=30, exclude=[is_client_error], name="usda")
+WEATHER_BREAKER = pybreaker.CircuitBreaker(fail_max=5, reset_timeout=30, exclude=[is_client_error], name="weather")
+
+def guarded_request(breaker: pybreaker.CircuitBreaker, method: str, url: str, **kwargs) -> requests.Response:
+    """Send through HTTP_SESSION; failures count toward the breaker, which fails fast while open"""
+    # calling() only holds the breaker lock for the state check, so concurrent requests are not serialized
+    with breaker.calling():
+        response = HTTP_SESSION.request(method, url, **kwargs)
+        try:
+            response.raise_for_status()
+        except Exception:
+            # Release the connection, which a stream=True response would otherwise keep checked out
+            response.close()
+            raise
+    return response
+
+# Thread pool for fanning out upstream lookups on the (threaded) dev server
+LOOKUP_POOL = ThreadPoolExecutor(max_workers=LOOKUP_POOL_SIZE)
+
+@contextmanager
+def lookup_pool():
+    """Executor for one request's lookups; under gevent each request gets its own so it never queues behind others"""
+    if not GEVENT_ACTIVE:
+        yield LOOKUP_POOL
+        return
+    pool = ThreadPoolExecutor(max_workers=LOOKUP_POOL_SIZE)
+    try:
+        yield pool
+    finally:
+        pool.shutdown(wait=False)
+
+# On-disk cache for USDA data and chat replies; survives restarts and is shared by all
+# gunicorn workers (diskcache is thread- and process-safe, so no lock is needed)
+CACHE_DIR = os.getenv("NUTRI_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+DISK_CACHE = Cache(CACHE_DIR, size_limit=2**30)
+FOOD_CACHE_TTL = 86400
+CHAT_CACHE_TTL = 3600
+
+# In-process caches for short-lived lookups
+WEATHER_CACHE = TTLCache(maxsize=1024, ttl=600)
+GROCERY_CACHE = TTLCache(maxsize=512, ttl=86400)
+CACHE_LOCK = threading.Lock()
+
+def cache_key(*parts) -> str:
+    """Stable digest of JSON-serializable request parts"""
+    raw = orjson.dumps(parts, default=str, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    return hashlib.sha256(raw).hexdigest()
+
 # ----------------- GOOGLE FIT FUNCTIONS -----------------
 def get_google_fit_data(credentials):
     """Fetch steps and calories from Google Fit API"""
@@ -720,7 +846,7 @@ def get_google_fit_data(credentials):
                     if 'value' in point and len(point['value']) > 0
                 )
                 fitness_data['steps'] = total_steps
-                print(f"✅ Fetched {total_steps} steps")
+                logger.debug("✅ Fetched %s steps", total_steps)
             
             calories_datasource = "derived:com.google.calories.expended:com.google.android.gms:merge_calories_expended"
             calories_dataset = service.users().dataSources().datasets().get(
@@ -736,11 +862,10 @@ def get_google_fit_data(credentials):
                     if 'value' in point and len(point['value']) > 0
                 )
                 fitness_data['calories_burned'] = round(total_calories, 2)
-                print(f"✅ Fetched {total_calories:.2f} calories")
+                logger.debug("✅ Fetched %.2f calories", total_calories)
             
         except Exception as e:
-            print(f"❌ Error fetching fitness data: {e}")
-            traceback.print_exc()
+            logger.exception("❌ Error fetching fitness data: %s", e)
         
         fitness_data['distance'] = round((fitness_data['steps'] * 0.75) / 1000, 2)
         fitness_data['active_minutes'] = round(fitness_data['steps'] / 100)
@@ -748,8 +873,7 @@ def get_google_fit_data(credentials):
         return fitness_data
         
     except Exception as e:
-        print(f"❌ Error in get_google_fit_data: {e}")
-        traceback.print_exc()
+        logger.exception("❌ Error in get_google_fit_data: %s", e)
         return {
             'steps': 0,
             'calories_burned': 0,
@@ -818,19 +942,27 @@ def get_weather(city: str):
     if not WEATHER_API_KEY:
         return {"condition": "Unknown", "temp": 25, "humidity": 50}
     
+    key = city.strip().lower()
+    with CACHE_LOCK:
+        cached = WEATHER_CACHE.get(key)
+    if cached is not None:
+        return cached
+    
     try:
         url = "http://api.weatherapi.com/v1/current.json"
         params = {"key": WEATHER_API_KEY, "q": city, "aqi": "no"}
-        r = requests.get(url, params=params, timeout=8)
-        r.raise_for_status()
-        d = r.json()
-        return {
+        r = guarded_request(WEATHER_BREAKER, "GET", url, params=params, timeout=8)
+        d = orjson.loads(r.content)
+        weather = {
             "condition": d["current"]["condition"]["text"],
             "temp": d["current"]["temp_c"],
             "humidity": d["current"]["humidity"],
         }
+        with CACHE_LOCK:
+            WEATHER_CACHE[key] = weather
+        return weather
     except Exception as e:
-        print(f"❌ Weather API error: {e}")
+        logger.error("❌ Weather API error: %s", e)
         return {"condition": "Unknown", "temp": 25, "humidity": 50}
 
 # ----------------- NUTRIENTS FETCH -----------------
@@ -855,31 +987,110 @@ def get_serving_size(food_name: str) -> int:
             return SERVING_SIZES[key]
     return SERVING_SIZES["default"]
 
-def get_food_nutrients(food: str) -> Dict[str, tuple]:
-    url = "https://api.nal.usda.gov/fdc/v1/foods/search"
+USDA_SEARCH_URL = "https://api.nal.usda.gov/fdc/v1/foods/search"
+USDA_FOODS_URL = "https://api.nal.usda.gov/fdc/v1/foods"
+# POST /foods accepts at most 20 fdcIds per call
+USDA_BATCH_SIZE = 20
+
+def empty_nutrient_vector() -> np.ndarray:
+    return np.full(len(NUTRIENT_ORDER), np.nan)
+
+def parse_food_nutrients(food_data: Dict[str, Any]) -> np.ndarray:
+    """Per-100g mg amounts in NUTRIENT_ORDER from a search hit or /foods record; NaN where USDA reports none"""
+    nutrients = {}
+    for n in food_data.get("foodNutrients", []):
+        nutrient = n.get("nutrient") or {}
+        name = n.get("nutrientName") or n.get("name") or nutrient.get("name")
+        val = n.get("value", n.get("amount"))
+        unit = n.get("unitName") or n.get("unit") or nutrient.get("unitName")
+        if name and val is not None:
+            try:
+                nutrients[name.strip()] = (float(val), unit or "")
+            except Exception:
+                continue
+    
+    # Matching and unit conversion happen once here, so cached entries are ready to sum
+    per_100g_mg = empty_nutrient_vector()
+    for name, (val, unit) in nutrients.items():
+        match = NUTRIENT_PATTERN.search(name.lower())
+        if not match:
+            continue
+        idx = NUTRIENT_INDEX[NUTRIENT_SUBSTRING_KEY[match.group(0)]]
+        per_100g_mg[idx] = np.nan_to_num(per_100g_mg[idx]) + convert_to_mg(val, unit)
+    return per_100g_mg
+
+def get_food_nutrients(food: str) -> np.ndarray:
+    food = food.strip().lower()
+    cached = DISK_CACHE.get(("food_mg", food))
+    if cached is not None:
+        return cached
+    
     params = {"api_key": USDA_API_KEY, "query": food, "pageSize": 1}
     try:
-        r = requests.get(url, params=params, timeout=10)
-        r.raise_for_status()
-        data = r.json()
-        nutrients = {}
+        r = guarded_request(USDA_BREAKER, "GET", USDA_SEARCH_URL, params=params, timeout=10)
+        data = orjson.loads(r.content)
+        nutrients = empty_nutrient_vector()
         foods = data.get("foods", [])
-        if not foods:
-            return nutrients
-        food_data = foods[0]
-        for n in food_data.get("foodNutrients", []):
-            name = n.get("nutrientName") or n.get("name")
-            val = n.get("value")
-            unit = n.get("unitName") or n.get("unit")
-            if name and val is not None:
-                try:
-                    nutrients[name.strip()] = (float(val), unit or "")
-                except Exception:
-                    continue
+        if foods:
+            nutrients = parse_food_nutrients(foods[0])
+        DISK_CACHE.set(("food_mg", food), nutrients, expire=FOOD_CACHE_TTL)
+        if foods and foods[0].get("fdcId"):
+            DISK_CACHE.set(("fdc", food), foods[0]["fdcId"])
         return nutrients
     except Exception as e:
-        print(f"❌ USDA API error for {food}: {e}")
+        logger.error("❌ USDA API error for %s: %s", food, e)
+        return empty_nutrient_vector()
+
+def fetch_foods_by_fdc_id(fdc_ids: Dict[str, int]) -> Dict[str, np.ndarray]:
+    """Fetch up to USDA_BATCH_SIZE already-resolved foods in one POST /foods call"""
+    params = {"api_key": USDA_API_KEY}
+    # No nutrients filter: records must carry the same nutrients a search hit does, so both paths sum alike
+    payload = {"fdcIds": list(fdc_ids.values()), "format": "abridged"}
+    try:
+        r = guarded_request(USDA_BREAKER, "POST", USDA_FOODS_URL, params=params, json=payload, timeout=10)
+        by_id = {f.get("fdcId"): parse_food_nutrients(f) for f in orjson.loads(r.content)}
+    except Exception as e:
+        logger.error("❌ USDA batch error for %s: %s", list(fdc_ids), e)
         return {}
+    
+    found = {food: by_id[fdc_id] for food, fdc_id in fdc_ids.items() if fdc_id in by_id}
+    for food, nutrients in found.items():
+        DISK_CACHE.set(("food_mg", food), nutrients, expire=FOOD_CACHE_TTL)
+    return found
+
+def get_foods_nutrients(foods: List[str], pool: ThreadPoolExecutor) -> List[np.ndarray]:
+    """Nutrients for each food: cache first, then batches for known fdcIds alongside searches for the rest"""
+    keys = [f.strip().lower() for f in foods]
+    results = {}
+    known_ids = {}
+    for key in set(keys):
+        cached = DISK_CACHE.get(("food_mg", key))
+        if cached is not None:
+            results[key] = cached
+            continue
+        fdc_id = DISK_CACHE.get(("fdc", key))
+        if fdc_id is not None:
+            known_ids[key] = fdc_id
+    
+    id_items = list(known_ids.items())
+    batch_futures = [
+        pool.submit(fetch_foods_by_fdc_id, dict(id_items[i:i + USDA_BATCH_SIZE]))
+        for i in range(0, len(id_items), USDA_BATCH_SIZE)
+    ]
+    search_futures = {
+        key: pool.submit(get_food_nutrients, key)
+        for key in set(keys) if key not in results and key not in known_ids
+    }
+    for future in batch_futures:
+        results.update(future.result())
+    for key, future in search_futures.items():
+        results[key] = future.result()
+    
+    # Known foods the batch did not return fall back to a search
+    missing = [key for key in set(keys) if key not in results]
+    results.update(zip(missing, pool.map(get_food_nutrients, missing)))
+    
+    return [results[key] for key in keys]
 
 def convert_to_mg(amount: float, unit: str) -> float:
     unit = (unit or "").lower()
@@ -897,52 +1108,56 @@ NUTRIENT_KEY_MAP = {
     "Fiber": ["fiber", "dietary fiber"],
 }
 
-def calculate_deficiency(total_nutrients_mg: Dict[str,float], gender: str, height_cm: float, weight_kg: float, fitness_data: Dict = None):
-    baseline = {
-        "Protein_g": 50.0,
-        "Vitamin C_mg": 90.0,
-        "Iron_mg": 18.0 if gender.lower() == "female" else 8.0,
-        "Calcium_mg": 1000.0,
-        "Fiber_g": 30.0,
-    }
+# All substrings compiled into one alternation so each nutrient name is scanned once
+NUTRIENT_SUBSTRING_KEY = {sub: friendly for friendly, subs in NUTRIENT_KEY_MAP.items() for sub in subs}
+NUTRIENT_PATTERN = re.compile("|".join(
+    re.escape(sub) for sub in sorted(NUTRIENT_SUBSTRING_KEY, key=len, reverse=True)
+))
+
+# Fixed nutrient order shared by the totals vector and the baselines
+NUTRIENT_ORDER = ("Protein", "Fiber", "Vitamin C", "Iron", "Calcium")
+NUTRIENT_INDEX = {name: i for i, name in enumerate(NUTRIENT_ORDER)}
+GRAM_NUTRIENTS = ("Protein", "Fiber")
+
+# Daily baselines in mg, precomputed per (BMI band: under/normal/over) x (gender: male/female)
+GENDER_BASELINES_MG = np.array([
+    [50_000.0, 30_000.0, 90.0, 8.0, 1000.0],
+    [50_000.0, 30_000.0, 90.0, 18.0, 1000.0],
+], dtype=np.float64)
+BMI_BAND_SCALE = np.array([1.10, 1.0, 0.90])
+BASELINE_TABLE = BMI_BAND_SCALE[:, None, None] * GENDER_BASELINES_MG[None, :, :]
+
+ACTIVITY_SCALE_HIGH = np.array([1.3, 1.1, 1.0, 1.0, 1.1])
+ACTIVITY_SCALE_MODERATE = np.array([1.2, 1.0, 1.0, 1.0, 1.05])
+
+def format_nutrient(name: str, amount_mg: float) -> str:
+    if name in GRAM_NUTRIENTS:
+        return f"{round(float(amount_mg)/1000.0, 2)} g"
+    return f"{round(float(amount_mg), 2)} mg"
+
+def deficiency_kernel(totals_mg: np.ndarray, baselines_mg: np.ndarray) -> np.ndarray:
+    """Amount still needed per nutrient, or 0 where intake reaches 60% of the baseline"""
+    return np.where(totals_mg < baselines_mg * 0.6, baselines_mg - totals_mg, 0.0)
+
+def calculate_deficiency(total_nutrients_mg: np.ndarray, gender: str, height_cm: float, weight_kg: float, fitness_data: Dict = None):
+    bmi = weight_kg / ((height_cm / 100.0) ** 2) if height_cm > 0 else 0
+    band = 0 if bmi and bmi < 18.5 else 2 if bmi > 25 else 1
+    gi = 1 if gender.lower() == "female" else 0
+    baselines = BASELINE_TABLE[band, gi]
     
     if fitness_data:
         steps = fitness_data.get('steps', 0)
         if steps > 10000:
-            baseline["Protein_g"] *= 1.3
-            baseline["Calcium_mg"] *= 1.1
-            baseline["Fiber_g"] *= 1.1
+            baselines = baselines * ACTIVITY_SCALE_HIGH
         elif steps > 7000:
-            baseline["Protein_g"] *= 1.2
-            baseline["Calcium_mg"] *= 1.05
-    
-    bmi = weight_kg / ((height_cm / 100.0) ** 2) if height_cm > 0 else 0
-    if bmi and bmi < 18.5:
-        for k in baseline:
-            baseline[k] *= 1.10
-    elif bmi and bmi > 25:
-        for k in baseline:
-            baseline[k] *= 0.90
-
-    deficiencies = {}
-    protein_mg = total_nutrients_mg.get("Protein", 0.0)
-    fiber_mg = total_nutrients_mg.get("Fiber", 0.0)
-    
-    if protein_mg < (baseline["Protein_g"] * 1000.0) * 0.6:
-        need_mg = baseline["Protein_g"] * 1000.0 - protein_mg
-        deficiencies["Protein"] = f"{round(need_mg/1000.0, 2)} g"
-    if fiber_mg < (baseline["Fiber_g"] * 1000.0) * 0.6:
-        need_mg = baseline["Fiber_g"] * 1000.0 - fiber_mg
-        deficiencies["Fiber"] = f"{round(need_mg/1000.0, 2)} g"
-
-    for short_key, base_key in [("Vitamin C", "Vitamin C_mg"), ("Iron", "Iron_mg"), ("Calcium", "Calcium_mg")]:
-        have = total_nutrients_mg.get(short_key, 0.0)
-        need = baseline[base_key]
-        if have < need * 0.6:
-            need_more = need - have
-            deficiencies[short_key] = f"{round(need_more, 2)} mg"
+            baselines = baselines * ACTIVITY_SCALE_MODERATE
+
+    need = deficiency_kernel(np.asarray(total_nutrients_mg, dtype=np.float64), baselines)
     
-    return deficiencies
+    return {
+        NUTRIENT_ORDER[i]: format_nutrient(NUTRIENT_ORDER[i], need[i])
+        for i in np.flatnonzero(need)
+    }
 
 def recommend_foods(defic: Dict[str,str], weather: Dict[str,Any], fitness_data: Dict = None, lang: str = 'en'):
     base = {
@@ -1169,78 +1384,194 @@ def predict_multi_timeline_health(profile: Dict, food_items: List[Dict], fitness
         }
         
     except Exception as e:
-        print(f"❌ Error in predict_multi_timeline_health: {e}")
-        traceback.print_exc()
+        logger.exception("❌ Error in predict_multi_timeline_health: %s", e)
         return {
             "success": False,
             "error": str(e)
         }
 
 # ----------------- GROQ AI CHAT -----------------
-def call_groq_chat(message: str, analysis: Dict[str, Any], fitness_data: Dict = None, lang: str = "en") -> str:
-    if not GROQ_API_KEY:
-        return "❌ Groq API key not configured."
-    
-    system_prompt = "You are a helpful AI Dietician. Provide concise nutrition and fitness advice.\n\n"
+def chat_cache_key(message: str, analysis: Dict[str, Any], fitness_data: Dict = None, lang: str = "en") -> str:
+    normalized_message = " ".join(message.lower().split())
+    return cache_key(normalized_message, analysis, fitness_data, lang)
+
+# Markdown code fence the model sometimes wraps JSON replies in
+CODE_FENCE_PATTERN = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.DOTALL)
+
+class GroceryItem(msgspec.Struct):
+    """One entry of the grocery list the model is asked to return"""
+    category: str
+    name: str
+    quantity: str
+
+FALLBACK_GROCERY_LIST = [
+    {"category": "Fruits & Vegetables", "name": "Spinach", "quantity": "500g"},
+    {"category": "Fruits & Vegetables", "name": "Tomatoes", "quantity": "1kg"},
+    {"category": "Fruits & Vegetables", "name": "Bananas", "quantity": "6 pieces"},
+    {"category": "Proteins", "name": "Chicken Breast", "quantity": "1kg"},
+    {"category": "Proteins", "name": "Eggs", "quantity": "12 pieces"},
+    {"category": "Proteins", "name": "Lentils", "quantity": "500g"},
+    {"category": "Grains & Cereals", "name": "Brown Rice", "quantity": "2kg"},
+    {"category": "Grains & Cereals", "name": "Whole Wheat Bread", "quantity": "2 loaves"},
+    {"category": "Dairy & Alternatives", "name": "Low-fat Milk", "quantity": "2L"},
+    {"category": "Dairy & Alternatives", "name": "Greek Yogurt", "quantity": "500g"},
+    {"category": "Snacks & Beverages", "name": "Green Tea", "quantity": "100g"},
+    {"category": "Snacks & Beverages", "name": "Almonds", "quantity": "200g"},
+    {"category": "Spices & Condiments", "name": "Olive Oil", "quantity": "500ml"},
+    {"category": "Spices & Condiments", "name": "Turmeric", "quantity": "50g"},
+]
+
+GROQ_UNAVAILABLE_MESSAGE = "❌ AI service is temporarily unavailable. Please try again shortly."
+
+CHAT_PROMPT_HEADER = "You are a helpful AI Dietician. Provide concise nutrition and fitness advice.\n\n"
+CHAT_PROMPT_FOOTER = "\nProvide 2-4 sentence responses."
+LANG_NAMES = {'en': 'English', 'hi': 'Hindi', 'te': 'Telugu'}
+
+# Consecutive chat turns share the same analysis, so rendered prompts are kept in a small LRU
+PROMPT_CACHE: "OrderedDict[str, str]" = OrderedDict()
+PROMPT_CACHE_SIZE = 64
+
+def render_system_prompt(analysis: Dict[str, Any], fitness_data: Dict = None, lang: str = "en") -> str:
+    parts = [CHAT_PROMPT_HEADER]
     
     if analysis:
-        system_prompt += "--- NUTRITION CONTEXT ---\n"
+        parts.append("--- NUTRITION CONTEXT ---\n")
         if analysis.get("total_nutrients"):
-            system_prompt += "\n[Nutrients]\n"
-            for k, v in analysis["total_nutrients"].items():
-                system_prompt += f"- {k}: {v}\n"
+            parts.append("\n[Nutrients]\n")
+            parts.extend(f"- {k}: {v}\n" for k, v in analysis["total_nutrients"].items())
         
         if analysis.get("deficient"):
-            system_prompt += "\n[Deficiencies]\n"
-            if analysis["deficient"]:
-                for k, v in analysis["deficient"].items():
-                    system_prompt += f"- {k}: need {v}\n"
-            else:
-                system_prompt += "- None detected\n"
+            parts.append("\n[Deficiencies]\n")
+            parts.extend(f"- {k}: need {v}\n" for k, v in analysis["deficient"].items())
         
         if analysis.get("weather"):
             w = analysis["weather"]
-            system_prompt += f"\n[Weather]\n- {w.get('condition')}, {w.get('temp')}°C\n"
+            parts.append(f"\n[Weather]\n- {w.get('condition')}, {w.get('temp')}°C\n")
     
     if fitness_data:
-        system_prompt += "\n--- FITNESS DATA ---\n"
-        system_prompt += f"- Steps: {fitness_data.get('steps', 0)}\n"
-        system_prompt += f"- Calories Burned: {fitness_data.get('calories_burned', 0)} kcal\n"
-        system_prompt += f"- Distance: {fitness_data.get('distance', 0)} km\n"
-        system_prompt += f"- Active Minutes: {fitness_data.get('active_minutes', 0)}\n"
+        parts.append(
+            "\n--- FITNESS DATA ---\n"
+            f"- Steps: {fitness_data.get('steps', 0)}\n"
+            f"- Calories Burned: {fitness_data.get('calories_burned', 0)} kcal\n"
+            f"- Distance: {fitness_data.get('distance', 0)} km\n"
+            f"- Active Minutes: {fitness_data.get('active_minutes', 0)}\n"
+        )
     
-    system_prompt += "\nProvide 2-4 sentence responses."
+    parts.append(CHAT_PROMPT_FOOTER)
     
-    lang_names = {'en': 'English', 'hi': 'Hindi', 'te': 'Telugu'}
     if lang != "en":
-        system_prompt += f"\nIMPORTANT: Respond ONLY in {lang_names.get(lang, lang)} language."
+        parts.append(f"\nIMPORTANT: Respond ONLY in {LANG_NAMES.get(lang, lang)} language.")
+    
+    return "".join(parts)
+
+def get_system_prompt(analysis: Dict[str, Any], fitness_data: Dict = None, lang: str = "en") -> str:
+    key = cache_key(analysis, fitness_data, lang)
+    with CACHE_LOCK:
+        prompt = PROMPT_CACHE.get(key)
+        if prompt is not None:
+            PROMPT_CACHE.move_to_end(key)
+            return prompt
+    
+    prompt = render_system_prompt(analysis, fitness_data, lang)
+    with CACHE_LOCK:
+        PROMPT_CACHE[key] = prompt
+        if len(PROMPT_CACHE) > PROMPT_CACHE_SIZE:
+            PROMPT_CACHE.popitem(last=False)
+    return prompt
+
+def build_chat_payload(message: str, analysis: Dict[str, Any], fitness_data: Dict = None, lang: str = "en") -> Dict[str, Any]:
+    system_prompt = get_system_prompt(analysis, fitness_data, lang)
+    model = GROQ_CHAT_FAST_MODEL if len(message) < 200 and not analysis.get("deficient") else GROQ_MODEL
+    
+    return {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": message}
+        ],
+        "temperature": 0.7,
+        "max_tokens": CHAT_MAX_TOKENS,
+        "stop": ["\n\n\n"]
+    }
+
+def groq_headers() -> Dict[str, str]:
+    return {
+        "Authorization": f"Bearer {GROQ_API_KEY}",
+        "Content-Type": "application/json"
+    }
+
+def call_groq_chat(message: str, analysis: Dict[str, Any], fitness_data: Dict = None, lang: str = "en") -> str:
+    if not GROQ_API_KEY:
+        return "❌ Groq API key not configured."
+    
+    key = chat_cache_key(message, analysis, fitness_data, lang)
+    cached = DISK_CACHE.get(("chat", key))
+    if cached is not None:
+        return cached
     
     try:
-        headers = {
-            "Authorization": f"Bearer {GROQ_API_KEY}",
-            "Content-Type": "application/json"
-        }
+        payload = build_chat_payload(message, analysis, fitness_data, lang)
         
-        payload = {
-            "model": GROQ_MODEL,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": message}
-            ],
-            "temperature": 0.7,
-            "max_tokens": 500
-        }
+        response = guarded_request(GROQ_BREAKER, "POST", GROQ_API_URL, headers=groq_headers(), json=payload, timeout=30)
+        logger.debug("Groq chat via %s took %.0f ms", payload["model"], response.elapsed.total_seconds() * 1000)
         
-        response = requests.post(GROQ_API_URL, headers=headers, json=payload, timeout=30)
-        response.raise_for_status()
-        
-        result = response.json()
-        return result["choices"][0]["message"]["content"]
+        result = orjson.loads(response.content)
+        reply = result["choices"][0]["message"]["content"]
+        if reply:
+            DISK_CACHE.set(("chat", key), reply, expire=CHAT_CACHE_TTL)
+        return reply
         
+    except pybreaker.CircuitBreakerError:
+        return GROQ_UNAVAILABLE_MESSAGE
     except Exception as e:
         return f"Error: {str(e)}"
 
+def stream_groq_chat(message: str, analysis: Dict[str, Any], fitness_data: Dict = None, lang: str = "en"):
+    """Yield reply tokens as Groq produces them; the full reply is cached once the stream completes"""
+    key = chat_cache_key(message, analysis, fitness_data, lang)
+    cached = DISK_CACHE.get(("chat", key))
+    if cached is not None:
+        yield cached
+        return
+    
+    payload = build_chat_payload(message, analysis, fitness_data, lang)
+    payload["stream"] = True
+    
+    tokens = []
+    try:
+        response = guarded_request(GROQ_BREAKER, "POST", GROQ_API_URL, headers=groq_headers(), json=payload, timeout=30, stream=True)
+    except pybreaker.CircuitBreakerError:
+        yield GROQ_UNAVAILABLE_MESSAGE
+        return
+    
+    completed = False
+    with response:
+        for line in response.iter_lines():
+            if not line.startswith(b"data: "):
+                continue
+            frame = line[len(b"data: "):]
+            if frame == b"[DONE]":
+                completed = True
+                break
+            event = orjson.loads(frame)
+            if "error" in event:
+                # Groq reports mid-stream failures in-band; surface its message, not a KeyError on "choices"
+                error = event["error"]
+                raise RuntimeError(f"Groq error: {error.get('message', error) if isinstance(error, dict) else error}")
+            token = event["choices"][0]["delta"].get("content")
+            if token:
+                tokens.append(token)
+                yield token
+    
+    # A stream cut off before [DONE] or one that produced no text must not be replayed
+    reply = "".join(tokens)
+    if completed and reply:
+        DISK_CACHE.set(("chat", key), reply, expire=CHAT_CACHE_TTL)
+
 # ----------------- ROUTES -----------------
+def sse_event(payload: Dict[str, Any]) -> bytes:
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
 @app.route("/")
 def home():
     return render_template("nutri.html")
@@ -1275,23 +1606,22 @@ def google_fit_login():
         session['state'] = state
         session.modified = True
         
-        print(f"✅ Generated state: {state}")
+        logger.debug("✅ Generated state: %s", state)
         
         return redirect(authorization_url)
         
     except Exception as e:
-        print(f"❌ OAuth init error: {e}")
-        traceback.print_exc()
+        logger.exception("❌ OAuth init error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route("/oauth2callback")
 def oauth2callback():
     try:
-        print(f"✅ Callback received")
+        logger.debug("✅ Callback received")
         state = session.get('state')
         
         if not state:
-            print("❌ No state found in session!")
+            logger.error("❌ No state found in session!")
             return redirect('/?fitness_error=session_lost')
         
         flow = Flow.from_client_config(
@@ -1324,12 +1654,11 @@ def oauth2callback():
         }
         session.modified = True
         
-        print("✅ Google Fit connected successfully!")
+        logger.info("✅ Google Fit connected successfully!")
         return redirect('/?fitness_connected=true')
         
     except Exception as e:
-        print(f"❌ OAuth callback error: {e}")
-        traceback.print_exc()
+        logger.exception("❌ OAuth callback error: %s", e)
         return redirect('/?fitness_error=' + str(e))
 
 @app.route("/api/fitness_data")
@@ -1347,7 +1676,7 @@ def fitness_data():
         })
         
     except Exception as e:
-        print(f"❌ Fitness data error: {e}")
+        logger.error("❌ Fitness data error: %s", e)
         return jsonify({"error": str(e), "authenticated": False}), 500
 
 @app.route("/analyze", methods=["POST"])
@@ -1367,17 +1696,6 @@ def analyze():
     if not city:
         return jsonify({"error": "City required"}), 400
 
-    weather = get_weather(city)
-    
-    fitness_data = None
-    if 'credentials' in session:
-        try:
-            credentials = Credentials(**session['credentials'])
-            fitness_data = get_google_fit_data(credentials)
-        except Exception as e:
-            print(f"⚠️ Could not fetch fitness data: {e}")
-
-    totals_mg = {}
     processed_items = []
     
     for it in items:
@@ -1399,34 +1717,36 @@ def analyze():
             "total_grams": total_grams
         })
         
-        print(f"📊 {name}: {qty_count} piece(s) = {total_grams}g (@ {serving_size_g}g/piece)")
+        logger.debug("📊 %s: %s piece(s) = %sg (@ %sg/piece)", name, qty_count, total_grams, serving_size_g)
+    
+    # Weather, Google Fit and the USDA lookups all overlap
+    with lookup_pool() as pool:
+        weather_future = pool.submit(get_weather, city)
         
-        nut = get_food_nutrients(name)
-        for full_name, (val, unit) in nut.items():
+        fitness_data = None
+        if 'credentials' in session:
             try:
-                actual = float(val) * (total_grams / 100.0)
-            except:
-                continue
-            matched_key = None
-            low = full_name.lower()
-            for friendly, substrings in NUTRIENT_KEY_MAP.items():
-                if any(s in low for s in substrings):
-                    matched_key = friendly
-                    break
-            if not matched_key:
-                continue
-            amount_mg = convert_to_mg(actual, unit)
-            totals_mg[matched_key] = totals_mg.get(matched_key, 0.0) + amount_mg
+                credentials = Credentials(**session['credentials'])
+                fitness_data = get_google_fit_data(credentials)
+            except Exception as e:
+                logger.warning("⚠️ Could not fetch fitness data: %s", e)
+        
+        # Cached entries are already mg per 100 g, so totals are one scaled sum over foods
+        names = [p["name"] for p in processed_items]
+        grams = np.array([p["total_grams"] for p in processed_items], dtype=np.float64)
+        per_100g_mg = np.array(get_foods_nutrients(names, pool)).reshape(-1, len(NUTRIENT_ORDER))
+        totals_mg = np.nansum(per_100g_mg * (grams / 100.0)[:, None], axis=0)
+        matched = ~np.isnan(per_100g_mg).all(axis=0)
+        
+        weather = weather_future.result()
 
     defic = calculate_deficiency(totals_mg, gender, height, weight, fitness_data)
     rec = recommend_foods(defic, weather, fitness_data, lang)
 
-    human_totals = {}
-    for k, v in totals_mg.items():
-        if k in ("Protein", "Fiber"):
-            human_totals[k] = f"{round(v/1000.0, 2)} g"
-        else:
-            human_totals[k] = f"{round(v, 2)} mg"
+    human_totals = {
+        NUTRIENT_ORDER[i]: format_nutrient(NUTRIENT_ORDER[i], totals_mg[i])
+        for i in np.flatnonzero(matched)
+    }
     
     adjusted_nutrition = None
     if fitness_data:
@@ -1462,15 +1782,27 @@ def chat():
                 credentials = Credentials(**session['credentials'])
                 fitness_data = get_google_fit_data(credentials)
             except Exception as e:
-                print(f"⚠️ Fitness data unavailable: {e}")
+                logger.warning("⚠️ Fitness data unavailable: %s", e)
+
+        if data.get("stream"):
+            def sse():
+                try:
+                    for token in stream_groq_chat(message, analysis_data or {}, fitness_data, lang=lang):
+                        yield sse_event({'token': token})
+                    yield sse_event({'done': True})
+                except Exception as e:
+                    logger.error("❌ Chat stream error: %s", e)
+                    yield sse_event({'error': str(e)})
+            
+            return Response(stream_with_context(sse()), mimetype="text/event-stream",
+                            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
         chat_reply = call_groq_chat(message, analysis_data or {}, fitness_data, lang=lang)
         
         return jsonify({"ok": True, "reply": chat_reply})
         
     except Exception as e:
-        print(f"❌ Chat error: {e}")
-        traceback.print_exc()
+        logger.exception("❌ Chat error: %s", e)
         return jsonify({"ok": False, "error": str(e)}), 500
 
 @app.route("/api/predict_progress", methods=["POST"])
@@ -1490,7 +1822,7 @@ def predict_progress():
                 credentials = Credentials(**session['credentials'])
                 fitness_data = get_google_fit_data(credentials)
             except Exception as e:
-                print(f"⚠️ Fitness data unavailable: {e}")
+                logger.warning("⚠️ Fitness data unavailable: %s", e)
         
         predictions = predict_multi_timeline_health(profile, food_items, fitness_data, lang)
         
@@ -1500,8 +1832,7 @@ def predict_progress():
         return jsonify(predictions)
         
     except Exception as e:
-        print(f"❌ Prediction error: {e}")
-        traceback.print_exc()
+        logger.exception("❌ Prediction error: %s", e)
         return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route("/api/generate_grocery_list", methods=["POST"])
@@ -1528,10 +1859,17 @@ def generate_grocery_list():
             except:
                 pass
         
+        profile_fields = ('name', 'age', 'gender', 'height', 'weight', 'goal',
+                          'systolicBP', 'diastolicBP', 'bloodSugar', 'cholesterol', 'city')
+        key = cache_key({f: data.get(f) for f in profile_fields}, fitness_context, lang)
+        with CACHE_LOCK:
+            cached = GROCERY_CACHE.get(key)
+        if cached is not None:
+            return jsonify({"grocery_list": cached})
+        
         lang_instruction = ""
-        lang_names = {'en': 'English', 'hi': 'Hindi', 'te': 'Telugu'}
         if lang != 'en':
-            lang_instruction = f"\nIMPORTANT: Generate food item names in {lang_names.get(lang, lang)} language, but keep category names in English."
+            lang_instruction = f"\nIMPORTANT: Generate food item names in {LANG_NAMES.get(lang, lang)} language, but keep category names in English."
         
         prompt = f"""Generate a personalized grocery list based on this profile:
 
@@ -1568,11 +1906,6 @@ Return ONLY valid JSON (no markdown, no explanations):
 
 Include 15-25 items tailored to goal: {data.get('goal')}"""
 
-        headers = {
-            "Authorization": f"Bearer {GROQ_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
         payload = {
             "model": GROQ_MODEL,
             "messages": [
@@ -1586,57 +1919,35 @@ Include 15-25 items tailored to goal: {data.get('goal')}"""
             "max_tokens": 2000
         }
         
-        response = requests.post(GROQ_API_URL, headers=headers, json=payload, timeout=30)
-        response.raise_for_status()
+        try:
+            response = guarded_request(GROQ_BREAKER, "POST", GROQ_API_URL, headers=groq_headers(), json=payload, timeout=30)
+        except pybreaker.CircuitBreakerError:
+            logger.warning("⚠️ Groq circuit open, serving fallback grocery list")
+            return jsonify({"grocery_list": FALLBACK_GROCERY_LIST, "note": "Using fallback list"})
         
-        result = response.json()
+        result = orjson.loads(response.content)
         ai_response = result["choices"][0]["message"]["content"].strip()
         
         try:
-            if "```json" in ai_response:
-                ai_response = ai_response.split("```json")[1].split("```")[0].strip()
-            elif "```" in ai_response:
-                ai_response = ai_response.split("```")[1].split("```")[0].strip()
-            
-            grocery_list = json.loads(ai_response)
-            
-            if not isinstance(grocery_list, list):
-                raise ValueError("Not a list")
+            fence = CODE_FENCE_PATTERN.search(ai_response)
+            if fence:
+                ai_response = fence.group(1)
             
-            for item in grocery_list:
-                if not all(k in item for k in ["category", "name", "quantity"]):
-                    raise ValueError("Missing fields")
+            items = msgspec.json.decode(ai_response, type=List[GroceryItem])
+            grocery_list = msgspec.to_builtins(items)
             
+            with CACHE_LOCK:
+                GROCERY_CACHE[key] = grocery_list
             return jsonify({"grocery_list": grocery_list})
             
-        except json.JSONDecodeError:
-            fallback_list = [
-                {"category": "Fruits & Vegetables", "name": "Spinach", "quantity": "500g"},
-                {"category": "Fruits & Vegetables", "name": "Tomatoes", "quantity": "1kg"},
-                {"category": "Fruits & Vegetables", "name": "Bananas", "quantity": "6 pieces"},
-                {"category": "Proteins", "name": "Chicken Breast", "quantity": "1kg"},
-                {"category": "Proteins", "name": "Eggs", "quantity": "12 pieces"},
-                {"category": "Proteins", "name": "Lentils", "quantity": "500g"},
-                {"category": "Grains & Cereals", "name": "Brown Rice", "quantity": "2kg"},
-                {"category": "Grains & Cereals", "name": "Whole Wheat Bread", "quantity": "2 loaves"},
-                {"category": "Dairy & Alternatives", "name": "Low-fat Milk", "quantity": "2L"},
-                {"category": "Dairy & Alternatives", "name": "Greek Yogurt", "quantity": "500g"},
-                {"category": "Snacks & Beverages", "name": "Green Tea", "quantity": "100g"},
-                {"category": "Snacks & Beverages", "name": "Almonds", "quantity": "200g"},
-                {"category": "Spices & Condiments", "name": "Olive Oil", "quantity": "500ml"},
-                {"category": "Spices & Condiments", "name": "Turmeric", "quantity": "50g"},
-            ]
-            return jsonify({"grocery_list": fallback_list, "note": "Using fallback list"})
+        except msgspec.DecodeError:
+            return jsonify({"grocery_list": FALLBACK_GROCERY_LIST, "note": "Using fallback list"})
         
     except Exception as e:
-        print(f"❌ Grocery list error: {e}")
-        traceback.print_exc()
+        logger.exception("❌ Grocery list error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 if __name__ == "__main__":
-    print("\n" + "="*60)
-    print("🚀 Starting NutriGuard AI with Full Multi-Language Support")
-    print("="*60)
-    print("🌐 Supported Languages: English, Hindi (हिंदी), Telugu (తెలుగు)")
-    print("="*60 + "\n")
-    app.run(host="0.0.0.0", port=int(os.getenv("PORT", "5000")), debug=True)
+    logger.info("🚀 Starting NutriGuard AI with Full Multi-Language Support")
+    logger.info("🌐 Supported Languages: English, Hindi (हिंदी), Telugu (తెలుగు)")
+    app.run(host="0.0.0.0", port=int(os.getenv("PORT", "5000")), debug=app.config['DEBUG'])
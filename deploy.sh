@@ -16,6 +16,8 @@ SERVICE_NAME="nutri"
 SOCKET_PATH="$PROJECT_DIR/${SERVICE_NAME}.sock"
 SYSTEMD_FILE="/etc/systemd/system/${SERVICE_NAME}.service"
 NGINX_SITE="/etc/nginx/sites-available/${SERVICE_NAME}"
+# Concurrent requests per gevent worker; app.py sizes its HTTP connection pool from the same value
+WORKER_CONNECTIONS=1000
 
 # Accept key from arg or env
 ARG_KEY="${1:-}"
@@ -45,7 +47,14 @@ cat > "$PROJECT_DIR/requirements-min.txt" <<'REQ'
 Flask==3.1.2
 requests
 gunicorn
+gevent
 python-dotenv
+cachetools
+numpy
+orjson
+msgspec
+pybreaker
+diskcache
 REQ
 
 # Install minimal + google-genai
@@ -95,7 +104,8 @@ Group=$(id -gn)
 WorkingDirectory=$PROJECT_DIR
 EnvironmentFile=$ENV_FILE
 Environment=PATH=$VENV_DIR/bin
-ExecStart=$VENV_DIR/bin/gunicorn --chdir $PROJECT_DIR --workers 3 --bind unix:$SOCKET_PATH --timeout 120 app:app
+Environment=WORKER_CONNECTIONS=$WORKER_CONNECTIONS
+ExecStart=$VENV_DIR/bin/gunicorn --chdir $PROJECT_DIR --worker-class gevent --workers 4 --worker-connections $WORKER_CONNECTIONS --bind unix:$SOCKET_PATH --timeout 120 app:app
 Restart=on-failure
 RestartSec=3
 LimitNOFILE=65536
@@ -0,0 +1,73 @@
+import unittest
+
+import numpy as np
+
+import app
+
+# (number, name, amount, unit) as USDA reports them for one food, including the
+# overlapping fiber/protein/iron entries that both lookup paths must sum alike
+FOOD_NUTRIENTS = [
+    ("203", "Protein", 7.5, "G"),
+    ("257", "Adjusted Protein", 7.2, "G"),
+    ("291", "Fiber, total dietary", 6.4, "G"),
+    ("295", "Fiber, soluble", 1.1, "G"),
+    ("297", "Fiber, insoluble", 5.3, "G"),
+    ("293", "Total dietary fiber (AOAC 2011.25)", 6.6, "G"),
+    ("401", "Vitamin C, total ascorbic acid", 1.5, "MG"),
+    ("303", "Iron, Fe", 2.9, "MG"),
+    ("304", "Iron, heme", 0.1, "MG"),
+    ("301", "Calcium, Ca", 35.0, "MG"),
+    ("208", "Energy", 230.0, "KCAL"),
+]
+
+
+def search_hit():
+    """A /foods/search hit"""
+    return {
+        "fdcId": 1,
+        "foodNutrients": [
+            {"nutrientNumber": number, "nutrientName": name, "value": amount, "unitName": unit}
+            for number, name, amount, unit in FOOD_NUTRIENTS
+        ],
+    }
+
+
+def abridged_record():
+    """A POST /foods record in abridged format"""
+    return {
+        "fdcId": 1,
+        "foodNutrients": [
+            {"number": number, "name": name, "amount": amount, "unitName": unit}
+            for number, name, amount, unit in FOOD_NUTRIENTS
+        ],
+    }
+
+
+class ParseFoodNutrientsTest(unittest.TestCase):
+    def test_search_hit_and_abridged_record_match(self):
+        from_search = app.parse_food_nutrients(search_hit())
+        from_batch = app.parse_food_nutrients(abridged_record())
+        np.testing.assert_array_equal(from_search, from_batch)
+
+    def test_batch_payload_requests_every_nutrient(self):
+        sent = {}
+
+        class Response:
+            content = b"[]"
+
+        def fake_request(breaker, method, url, **kwargs):
+            sent.update(kwargs["json"])
+            return Response()
+
+        original = app.guarded_request
+        app.guarded_request = fake_request
+        try:
+            app.fetch_foods_by_fdc_id({"lentils": 1})
+        finally:
+            app.guarded_request = original
+        self.assertEqual(sent.get("format"), "abridged")
+        self.assertNotIn("nutrients", sent)
+
+
+if __name__ == "__main__":
+    unittest.main()